@@ -1,9 +1,9 @@
 import numpy as np
+from bisect import bisect_right
 from datetime import timedelta, datetime
-from scipy.interpolate import interp1d
 
-def calculate_kgfr(cr1, cr2, delta_t_hours, weight, height, age, sex, muscle_factor=1.0):
-    """Calculates Kinetic GFR (kGFR) for AKI settings using Mass Balance."""
+def _creatinine_kinetics(weight, height, age, sex, muscle_factor=1.0):
+    """Returns (creatinine Vd in L, production rate in umol/hr); neither depends on the Cr values."""
     k_sex = 0.85 if sex == "Female" else 1.0
     
     # Calculate Ideal Body Weight (IBW) based on height (cm)
@@ -23,7 +23,15 @@ def calculate_kgfr(cr1, cr2, delta_t_hours, weight, height, age, sex, muscle_fac
     # Constant creatinine production rate (umol/hr) based on Cockcroft-Gault numerator
     # Apply muscle_factor here
     production_rate = (140 - age) * 88.4 * k_sex * 0.9 * 0.06 * muscle_factor
-    
+    return v_dist, production_rate
+
+def calculate_kgfr(cr1, cr2, delta_t_hours, weight, height, age, sex, muscle_factor=1.0):
+    """Calculates Kinetic GFR (kGFR) for AKI settings using Mass Balance."""
+    v_dist, production_rate = _creatinine_kinetics(weight, height, age, sex, muscle_factor)
+    return _kgfr(cr1, cr2, delta_t_hours, v_dist, production_rate)
+
+def _kgfr(cr1, cr2, delta_t_hours, v_dist, production_rate):
+    """kGFR mass balance with the patient constants already resolved by _creatinine_kinetics."""
     if delta_t_hours <= 0:
         # Fallback to instantaneous CrCl at cr2 if no time has passed
         return (production_rate / 0.06) / cr2
@@ -43,61 +51,106 @@ def calculate_kgfr(cr1, cr2, delta_t_hours, weight, height, age, sex, muscle_fac
     
     return kgfr
 
+def _kgfr_vec(cr1, cr2, delta_t_hours, v_dist, production_rate):
+    """Array version of _kgfr, evaluating many (cr1, cr2, dt) intervals in one call."""
+    cr1 = np.asarray(cr1, dtype=np.float64)
+    cr2 = np.asarray(cr2, dtype=np.float64)
+    delta_t_hours = np.asarray(delta_t_hours, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accumulation_rate = (v_dist * (cr2 - cr1)) / delta_t_hours
+        elimination_rate = production_rate - accumulation_rate
+        kgfr = np.where(elimination_rate <= 0, 0.1, elimination_rate / (0.06 * cr2))
+
+    # Same instantaneous CrCl fallback as the scalar version when no time has passed
+    return np.where(delta_t_hours <= 0, (production_rate / 0.06) / cr2, kgfr)
+
+def _constant_cr_function(val):
+    """Creatinine function for a fixed value; kGFR can't be estimated without a slope."""
+    val = float(val)
+
+    def cr_const(t):
+        return val, None
+
+    cr_const.vec = lambda ts: (np.full(np.shape(ts), val), None)
+    return cr_const
+
 def build_creatinine_function(cr_data, future_cr=None, modified_factor=1.0, patient_params=None):
-    # Sort and remove duplicates to prevent interpolation errors
-    cr_data = sorted(list(set(cr_data)), key=lambda x: x[0])
+    # Sort and remove duplicate timestamps to prevent interpolation errors
+    # np.unique returns the timestamps sorted, with the index of each one's first entry
+    t_all = np.asarray([d[0].timestamp() for d in cr_data], dtype=np.float64)
+    t_floats, uniq_idx = np.unique(t_all, return_index=True)
+    values_arr = np.asarray([d[1] for d in cr_data], dtype=np.float64)[uniq_idx]
+    
+    values = values_arr.tolist()
     
     # Modified factor (to allow for future projections or hypothetical Cr adjustments) left here in case UI element is added back in later
     if modified_factor != 1.0:
-        base_val = cr_data[0][1] * modified_factor
-        return lambda t: (float(base_val), None)
-
-    times = [d[0] for d in cr_data]
-    values = [d[1] for d in cr_data]
+        base_val = values[0] * modified_factor
+        return _constant_cr_function(base_val)
     
-    t_floats = [x.timestamp() for x in times]
-    
-    # If there is only 1 point, interp1d will crash, so we handle it gracefully
-    if len(times) < 2:
-        return lambda t: (float(values[0]), None)
-        
-    interp_func = interp1d(t_floats, values, kind='linear', bounds_error=False, fill_value=(values[0], values[-1]))
+    # With only 1 point there is no slope to interpolate or calculate kGFR from
+    if len(values) < 2:
+        return _constant_cr_function(values[0])
 
-    def cr_logic(t):
-        # Robustness check: if t is not a datetime, return first value
-        if not isinstance(t, datetime):
-            return float(values[0]), None
-            
-        current_val = float(interp_func(t.timestamp()))
+    # The IBW/sex branches and production rate are fixed for the patient, so resolve them once here
+    if patient_params is not None:
+        v_dist, production_rate = _creatinine_kinetics(
+            patient_params['weight'], patient_params['height'],
+            patient_params['age'], patient_params['sex'],
+            muscle_factor=patient_params.get('muscle_factor', 1.0)
+        )
+
+    # Scalar lookups use plain floats + bisect; np.interp on a single value pays array overhead every call
+    t_list = t_floats.tolist()
+
+    def interp_scalar(ts):
+        if ts <= t_list[0]:
+            return values[0]
+        if ts >= t_list[-1]:
+            return values[-1]
+        j = bisect_right(t_list, ts)
+        slope = (values[j] - values[j-1]) / (t_list[j] - t_list[j-1])
+        return slope * (ts - t_list[j-1]) + values[j-1]
+
+    def cr_logic_ts(ts):
+        """Scalar lookup on a float timestamp (seconds); cr_logic resolves the datetime first."""
+        current_val = interp_scalar(ts)
         # Prevent extrapolated creatinine from dropping below physiological limits
         current_val = max(10.0, current_val)
         
         if patient_params is None:
             return current_val, None
             
-        # Find the interval to calculate kGFR slope
-        if t < times[0]:
-            idx = 0
-        elif t >= times[-1]:
-            idx = len(times) - 2 # Use the most recent interval for the future
-        else:
-            idx = 0
-            for i in range(len(times)-1):
-                if times[i] <= t < times[i+1]:
-                    idx = i
-                    break
-        
-        dt_hours = (times[idx+1] - times[idx]).total_seconds() / 3600
+        # Find the interval to calculate kGFR slope (binary search, same rule as searchsorted side='right')
+        # Clamped to the first interval before the data and the most recent interval for the future
+        idx = min(max(bisect_right(t_list, ts) - 1, 0), len(t_list) - 2)
         
-        muscle_factor = patient_params.get('muscle_factor', 1.0)
+        dt_hours = (t_list[idx+1] - t_list[idx]) / 3600
         
-        # UPDATED: Pass height down to calculate_kgfr for the IBW calculation
-        kgfr = calculate_kgfr(
-            values[idx], values[idx+1], dt_hours, 
-            patient_params['weight'], patient_params['height'], 
-            patient_params['age'], patient_params['sex'],
-            muscle_factor=muscle_factor
-        )
+        kgfr = _kgfr(values[idx], values[idx+1], dt_hours, v_dist, production_rate)
         return current_val, kgfr
 
+    def cr_logic(t):
+        # Robustness check: if t is not a datetime, return first value
+        if not isinstance(t, datetime):
+            return float(values[0]), None
+        return cr_logic_ts(t.timestamp())
+
+    def cr_logic_vec(ts):
+        """Array fast path of cr_logic: takes float timestamps (seconds) and returns (cr_vals, kgfrs)."""
+        ts = np.asarray(ts, dtype=np.float64)
+        vals = np.maximum(np.interp(ts, t_floats, values_arr), 10.0)
+
+        if patient_params is None:
+            return vals, None
+
+        # Same interval choice as the scalar search, clamped to the first/most recent interval
+        idx = np.clip(np.searchsorted(t_floats, ts, side='right') - 1, 0, len(t_floats) - 2)
+        dt_hours = (t_floats[idx + 1] - t_floats[idx]) / 3600
+
+        kgfrs = _kgfr_vec(values_arr[idx], values_arr[idx + 1], dt_hours, v_dist, production_rate)
+        return vals, kgfrs
+
+    cr_logic.vec = cr_logic_vec
     return cr_logic
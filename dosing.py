@@ -1,56 +1,70 @@
-from datetime import timedelta
+"""
+Dose schedule builders and regimen suggestion.
+
+Dose schedules are (N, 2) float64 arrays: column 0 is time in hours from sim_start,
+column 1 is the dose in mg. Use to_tuples() where a list of (hours, mg) tuples is needed.
+"""
 import numpy as np
+from functools import lru_cache
+
+# Standard regimen options, shared read-only by every suggest_regimen call
+_ALLOWED_INTERVALS = np.array([6, 8, 12, 18, 24, 36, 48, 72], dtype=np.float64)
+_ALLOWED_DOSES = np.array([500, 750, 1000, 1250, 1500, 1750, 2000, 2500], dtype=np.float64)
+_ALLOWED_INTERVALS.setflags(write=False)
+_ALLOWED_DOSES.setflags(write=False)
 
 # --- Existing manual/ordered dose functions ---
+def to_tuples(doses):
+    """Converts an (N, 2) dose array to a list of (hours, mg) tuples for legacy call sites."""
+    return [tuple(row) for row in np.asarray(doses, dtype=np.float64).reshape(-1, 2).tolist()]
+
 def build_manual_doses(dose_list, time_list, sim_start):
-    doses = []
-    for dose, dt in zip(dose_list, time_list):
-        t_hours = (dt - sim_start).total_seconds() / 3600
-        doses.append((t_hours, dose))
-    return doses
+    # Offset every dose time from sim_start in one datetime64 subtraction
+    times = np.array(time_list, dtype='datetime64[us]')
+    t_hours = (times - np.datetime64(sim_start, 'us')).astype(np.float64) / 3.6e9
+    # 2-column (hours, mg) array; the simulator consumes the columns without unpacking tuples
+    return np.column_stack([t_hours, np.asarray(dose_list, dtype=np.float64)]).reshape(-1, 2)
 
 def build_ordered_doses(dose_mg, interval_h, start_dt, sim_start, sim_end):
-    doses = []
-    t = start_dt
-    while t <= sim_end:
-        hours_since_start = (t - sim_start).total_seconds() / 3600
-        doses.append((hours_since_start, dose_mg))
-        t += timedelta(hours=interval_h)
-    return doses
+    # The schedule is an arithmetic progression, so compute every dose time in one step
+    start_h = (start_dt - sim_start).total_seconds() / 3600
+    end_h = (sim_end - sim_start).total_seconds() / 3600
+    t_hours = np.arange(start_h, end_h + 1e-9, interval_h)
+    # Same (N, 2) layout as build_manual_doses so the two can be concatenated directly
+    return np.column_stack([t_hours, np.full_like(t_hours, dose_mg)])
 
 def suggest_regimen(pk, target_auc=500, patient_info=None):
     """
     Suggests a dose + interval based on half-life and target AUC.
     """
-    allowed_intervals = [6, 8, 12, 18, 24, 36, 48, 72]
-    allowed_doses = np.array([500, 750, 1000, 1250, 1500, 1750, 2000, 2500])
+    return _suggest_regimen_cached(float(pk.ke), float(pk.ke_multiplier), float(pk.vd), float(target_auc))
 
+@lru_cache(maxsize=128)
+def _suggest_regimen_cached(ke, ke_multiplier, vd, target_auc):
+    """suggest_regimen on plain floats, memoized since it only depends on these four values."""
     # Calculate current clearance (Cl = Ke * Vd)
-    # Using pk.ke (baseline) * pk.ke_multiplier (Bayesian fit)
-    cl = (pk.ke * pk.ke_multiplier) * pk.vd  
-    vd = pk.vd                                          
+    # Using ke (baseline) * ke_multiplier (Bayesian fit)
+    cl = (ke * ke_multiplier) * vd  
 
     # 1. Calculate half-life
     half_life = (np.log(2) * vd / cl) if cl > 0 else 24
     
-    # 2. Find interval closest to half-life
-    idx = np.argmin([abs(i - half_life) for i in allowed_intervals])
-    best_interval = allowed_intervals[idx]
+    # 2. Find interval closest to half-life (single vectorized distance + argmin)
+    idx = int(np.argmin(np.abs(_ALLOWED_INTERVALS - half_life)))
+    best_interval = int(_ALLOWED_INTERVALS[idx])
     
     # 3. Rule: Extend to next interval if half-life > 1.2x the tested interval
-    if half_life > 1.2 * best_interval and idx < len(allowed_intervals) - 1:
-        best_interval = allowed_intervals[idx + 1]
+    if half_life > 1.2 * best_interval and idx < len(_ALLOWED_INTERVALS) - 1:
+        idx += 1
+        best_interval = int(_ALLOWED_INTERVALS[idx])
 
-    # 4. Find the standard dose closest to target AUC (500) for this interval
+    # 4. Find the standard dose closest to target AUC for this interval
     # AUC24 = (Daily Dose) / Clearance
     doses_per_day = 24 / best_interval
-    target_daily_dose = target_auc * cl
-    dose_est = target_daily_dose / doses_per_day
-    
-    # Round to nearest allowed increment
-    dose_rounded = int(allowed_doses[np.argmin(np.abs(allowed_doses - dose_est))])
-    
-    # Recalculate actual predicted AUC for the rounded dose
-    predicted_auc = (dose_rounded * doses_per_day) / cl
+    dose_est = target_auc * cl / doses_per_day
 
-    return (dose_rounded, best_interval, predicted_auc)
\ No newline at end of file
+    # Standard dose nearest the estimate, read straight from the table (argmin keeps the lower dose on a tie)
+    j = int(np.argmin(np.abs(_ALLOWED_DOSES - dose_est)))
+
+    # Recalculate actual predicted AUC for the rounded dose
+    return (int(_ALLOWED_DOSES[j]), best_interval, _ALLOWED_DOSES[j] * doses_per_day / cl)
\ No newline at end of file
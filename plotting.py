@@ -1,23 +1,115 @@
-from datetime import timedelta
+import numpy as np
 import plotly.graph_objects as go
+from functools import lru_cache
+
+# Static figure styling, built and validated once at import; every figure applies it unchanged
+_BASE_LAYOUT = go.Layout(
+    plot_bgcolor='white',
+    paper_bgcolor='white',
+    xaxis=dict(
+        title=dict(text="Date/Time", font=dict(color="black")),
+        tickfont=dict(color="black"),            
+        type="date",     
+        tickformat="%d %b", 
+        hoverformat="%b %d, %H:%M", 
+        dtick=86400000, 
+        showline=True, 
+        linecolor='black', 
+        gridcolor='lightgrey',
+        showgrid=True
+    ),
+    yaxis=dict(
+        title=dict(text="Vanco (mg/L)", font=dict(color="blue")),
+        tickfont=dict(color="blue"),
+        showline=True, 
+        linecolor='black',
+        gridcolor='lightgrey',
+        showgrid=True,
+        zeroline=True,
+        zerolinecolor='lightgrey',
+        rangemode='tozero'         
+    ),
+    yaxis2=dict(
+        showticklabels=False,   # Removes the numbers on the right
+        title=None,             # Removes the side title
+        overlaying="y",
+        side="right",
+        showline=False,
+        showgrid=False,
+        zeroline=False,
+        rangemode='tozero',
+        fixedrange=True,        # Prevents accidental zooming on the hidden axis
+        matches=None            # Ensure it scales independently
+    ),
+    hovermode="x unified",  
+    legend=dict(
+        orientation="v", 
+        yanchor="top",
+        y=0.99, 
+        xanchor="left",
+        x=0.01,
+        font=dict(color="black", size=11),
+        bgcolor="rgba(255, 255, 255, 0.7)", 
+        bordercolor="black",
+        borderwidth=1
+    ),
+    margin=dict(l=40, r=40, t=40, b=40)
+)
+
+def _hours_to_dt64(sim_start, hours):
+    """Converts simulation hours to a datetime64 array in one vectorized step (Plotly takes these natively)."""
+    offsets_us = np.rint(np.asarray(hours, dtype=np.float64) * 3.6e9).astype('timedelta64[us]')
+    return np.datetime64(sim_start, 'us') + offsets_us
+
+# Line traces longer than this are min/max decimated before they go to Plotly
+_MAX_PLOT_POINTS = 4000
+
+def _minmax_downsample(x, y, n_out=_MAX_PLOT_POINTS):
+    """
+    Keeps the min and max of each bucket (plus the end points) so peaks and troughs survive decimation.
+    Returns x, y unchanged when they already fit in n_out points.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size
+    if n <= n_out:
+        return x, y
+    size = -(-n // (n_out // 2))
+    n_buckets = -(-n // size)
+    blocks = np.full(n_buckets * size, np.nan)
+    blocks[:n] = y
+    blocks = blocks.reshape(n_buckets, size)
+    starts = np.arange(n_buckets) * size
+    idx = np.unique(np.concatenate([
+        starts + np.nanargmin(blocks, axis=1), starts + np.nanargmax(blocks, axis=1), [0, n - 1]
+    ]))
+    return np.asarray(x)[idx], y[idx]
+
+@lru_cache(maxsize=32)
+def _format_level_labels(levels, level_times):
+    """Hover/text labels for the measured levels; memoized so re-renders skip the strftime loop."""
+    return tuple(f"{lvl:.1f} mg/L<br>{t.strftime('%b %d, %H:%M')}" for lvl, t in zip(levels, level_times))
 
 def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=None, try_results=None, ci_bounds=None, static_crcl=None, results_kgfr=None):
     """
     Plots Vancomycin simulation with separate colors for CrCl and kGFR on the Y2 axis.
     """
-    t_dates_main = [sim_start + timedelta(hours=h) for h in results["time"]]
+    t_dates_main = _hours_to_dt64(sim_start, results["time"])
     
-    cr_plot_data = [cr_func(d) for d in t_dates_main]
-    kgfr_vals = [d[1] for d in cr_plot_data]
-    valid_kgfrs = [k for k in kgfr_vals if k is not None]
+    # Evaluate Cr/kGFR over the whole time grid in one vectorized call (kGFR is None without a slope)
+    ts_main = sim_start.timestamp() + np.asarray(results["time"], dtype=np.float64) * 3600.0
+    _, kgfr_vals = cr_func.vec(ts_main)
+    # One finiteness mask, reused for the kGFR trace and its label
+    kgfr_mask = np.isfinite(kgfr_vals) if kgfr_vals is not None else np.zeros(0, dtype=bool)
+    has_kgfr = bool(kgfr_mask.any())
 
-    fig = go.Figure()
+    # Collect every trace first so Plotly builds and validates the figure in one pass
+    traces = []
 
     # 1. Plot the Shadow Simulation (kGFR)
     if results_kgfr is not None:
-        t_dates_kgfr = [sim_start + timedelta(hours=h) for h in results_kgfr["time"]]
-        fig.add_trace(go.Scatter(
-            x=t_dates_kgfr, y=results_kgfr["conc"],
+        t_dates_kgfr, conc_kgfr = _minmax_downsample(_hours_to_dt64(sim_start, results_kgfr["time"]), results_kgfr["conc"])
+        traces.append(go.Scattergl(
+            x=t_dates_kgfr, y=conc_kgfr,
             mode='lines', name='Vanco (Predicted with kGFR)',
             line=dict(color='rgba(173, 216, 230, 0.6)', width=4) # Pale Blue (LightBlue)
         ))
@@ -25,10 +117,13 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
     # 2. Confidence Interval (IQR Shadow)
     if ci_bounds:
         res_lo, res_hi = ci_bounds
-        t_dates_ci = [sim_start + timedelta(hours=h) for h in res_lo["time"]]
-        fig.add_trace(go.Scatter(
-            x=t_dates_ci + t_dates_ci[::-1],
-            y=list(res_hi["conc"]) + list(res_lo["conc"])[::-1],
+        t_dates_ci = _hours_to_dt64(sim_start, res_lo["time"])
+        # Each bound is decimated on its own; the polygon still runs out along hi and back along lo
+        t_hi, conc_hi = _minmax_downsample(t_dates_ci, res_hi["conc"])
+        t_lo, conc_lo = _minmax_downsample(t_dates_ci, res_lo["conc"])
+        traces.append(go.Scattergl(
+            x=np.concatenate([t_hi, t_lo[::-1]]),
+            y=np.concatenate([conc_hi, conc_lo[::-1]]),
             fill='toself',
             fillcolor='rgba(0, 0, 255, 0.1)',
             line=dict(color='rgba(255,255,255,0)'),
@@ -37,9 +132,10 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
         ))
 
     # 3. Vanco Concentration Line (Main/CrCl)
-    fig.add_trace(go.Scatter(
-        x=t_dates_main, 
-        y=results["conc"], 
+    t_plot_main, conc_main = _minmax_downsample(t_dates_main, results["conc"])
+    traces.append(go.Scattergl(
+        x=t_plot_main, 
+        y=conc_main, 
         name="Vanco (Current)", 
         mode='lines',
         line=dict(color="blue", width=3)
@@ -47,9 +143,10 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
 
     # 4. Measured Levels (High-contrast markers with text labels)
     if levels is not None and len(levels) > 0:
-        level_texts = [f"{lvl:.1f} mg/L<br>{t.strftime('%b %d, %H:%M')}" for lvl, t in zip(levels, level_times)]
+        level_texts = list(_format_level_labels(tuple(levels), tuple(level_times)))
         
-        fig.add_trace(go.Scatter(
+        # Few points with text labels, so these stay SVG; every line trace above/below uses WebGL
+        traces.append(go.Scatter(
             x=level_times, 
             y=levels, 
             mode="markers+text",       
@@ -67,10 +164,10 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
 
     # 5. Try Regimen Comparison
     if try_results is not None:
-        t_dates_try = [sim_start + timedelta(hours=h) for h in try_results["time"]]
-        fig.add_trace(go.Scatter(
+        t_dates_try, conc_try = _minmax_downsample(_hours_to_dt64(sim_start, try_results["time"]), try_results["conc"])
+        traces.append(go.Scattergl(
             x=t_dates_try, 
-            y=try_results["conc"], 
+            y=conc_try, 
             name="Vanco ('Try' Regimen)", 
             mode='lines',
             line=dict(color="#29b09d", width=1.5)
@@ -78,10 +175,10 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
 
     # 6. Static Estimated CrCl 
     if static_crcl is not None:
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scattergl(
             # FIX: Use the full time array so points exist for the hover tool
             x=t_dates_main,
-            y=[static_crcl] * len(t_dates_main), 
+            y=np.full(len(t_dates_main), float(static_crcl)), 
             name=f"Est CrCl (CG): {static_crcl:.0f} mL/min",
             mode="lines",  
             line=dict(color='indigo', width=1, dash='dash'),
@@ -91,12 +188,13 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
         ))
 
     # 7. Kinetic GFR Line 
-    valid_kgfrs = [k for k in kgfr_vals if k is not None]
-    if valid_kgfrs:
-        latest_kgfr = valid_kgfrs[-1]
-        fig.add_trace(go.Scatter(
-            x=t_dates_main, 
-            y=kgfr_vals, 
+    if has_kgfr:
+        latest_kgfr = kgfr_vals[kgfr_mask][-1]
+        # Gaps (NaN) must stay in place, so only decimate a fully finite trace
+        t_kgfr, kgfr_plot = _minmax_downsample(t_dates_main, kgfr_vals) if kgfr_mask.all() else (t_dates_main, kgfr_vals)
+        traces.append(go.Scattergl(
+            x=t_kgfr, 
+            y=kgfr_plot, 
             name=f"Kinetic GFR: {latest_kgfr:.0f} mL/min", 
             line=dict(color="darkorchid", width=2, dash="dot"), 
             yaxis="y2",
@@ -106,61 +204,6 @@ def plot_vanco_simulation(sim_start, results, cr_func, levels=None, level_times=
 
     # --- STYLE & LEGEND ---
 
-    # Dynamic Y2 Axis Title
-    y2_title = "Kinetic GFR (mL/min)" if len(valid_kgfrs) > 0 else "Est CrCl (mL/min)"
-
-    fig.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        xaxis=dict(
-            title=dict(text="Date/Time", font=dict(color="black")),
-            tickfont=dict(color="black"),            
-            type="date",     
-            tickformat="%d %b", 
-            hoverformat="%b %d, %H:%M", 
-            dtick=86400000, 
-            showline=True, 
-            linecolor='black', 
-            gridcolor='lightgrey',
-            showgrid=True
-        ),
-        yaxis=dict(
-            title=dict(text="Vanco (mg/L)", font=dict(color="blue")),
-            tickfont=dict(color="blue"),
-            showline=True, 
-            linecolor='black',
-            gridcolor='lightgrey',
-            showgrid=True,
-            zeroline=True,
-            zerolinecolor='lightgrey',
-            rangemode='tozero'         
-        ),
-        yaxis2=dict(
-            showticklabels=False,   # Removes the numbers on the right
-            title=None,             # Removes the side title
-            overlaying="y",
-            side="right",
-            showline=False,
-            showgrid=False,
-            zeroline=False,
-            rangemode='tozero',
-            fixedrange=True,        # Prevents accidental zooming on the hidden axis
-            matches=None            # Ensure it scales independently
-        ),
-        hovermode="x unified",  
-                
-        legend=dict(
-                orientation="v", 
-                yanchor="top",
-                y=0.99, 
-                xanchor="left",
-                x=0.01,
-                font=dict(color="black", size=11),
-                bgcolor="rgba(255, 255, 255, 0.7)", 
-                bordercolor="black",
-                borderwidth=1
-            ),
-        margin=dict(l=40, r=40, t=40, b=40) 
-        )
+    fig = go.Figure(data=traces, layout=_BASE_LAYOUT)
     
     return fig
\ No newline at end of file
@@ -1,16 +1,176 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 from vanco_pk import VancoPK, pk_params_from_patient, calculate_ss_conc
 from creatinine import build_creatinine_function
 from dosing import (
     build_manual_doses,
     build_ordered_doses,
-    suggest_regimen
+    suggest_regimen,
+    to_tuples
 )
 from plotting import plot_vanco_simulation
-import uuid
+
+# Read the clock once per session: the PCr editor's new-row default is built from it, and a dynamic-row editor's
+# identity includes its column_config, so a per-rerun clock would reset the table whenever the minute rolled over
+_NOW = st.session_state.setdefault('now', datetime.now().replace(second=0, microsecond=0))
+
+# Dose/interval options shared by every selector, with index lookups for preselecting a value
+DOSES = (250, 500, 750, 1000, 1250, 1500, 1750, 2000, 2500)
+INTERVALS = (6, 8, 12, 18, 24, 36, 48, 72)
+_DOSE_IDX = {d: i for i, d in enumerate(DOSES)}
+_INT_IDX = {h: i for i, h in enumerate(INTERVALS)}
+
+# Static tab styling; sent on every rerun, since an element a rerun skips is removed from the page
+_TAB_CSS = """
+    <style>
+    div[data-testid="stTabs"] button { flex: 1; width: 100%; }
+    button[data-baseweb="tab"] {
+        font-size: 20px !important; font-weight: 800 !important;
+        background-color: #707070 !important; color: #FFFFFF !important;
+        border-radius: 8px 8px 0 0 !important; margin: 4px !important;
+        transition: background-color 0.3s ease;
+    }
+    button[aria-selected="true"] {
+        background-color: #e1f5fe !important; color: #007bff !important;
+        border-bottom: 5px solid #007bff !important;
+    }
+    button[data-baseweb="tab"]:hover {
+        background-color: #505050 !important; color: #007bff !important;
+    }
+    div[data-testid="stTabs"] p { font-size: 19px !important; font-weight: 800 !important; }
+    </style>
+    """
+
+# ---------------------------
+# Cached simulation helpers
+# ---------------------------
+@st.cache_resource(max_entries=32)
+def _cached_cr(cr_tuple, p_info_tuple):
+    """Builds the creatinine function once per distinct PCr/patient state (closures can't go through cache_data)."""
+    return build_creatinine_function(cr_data=list(cr_tuple), future_cr=None, modified_factor=1.0, patient_params=dict(p_info_tuple))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _fit_ke(ke, vd, doses_tuple, levels_tuple, level_times_tuple, sim_start, cr_tuple, p_info_tuple):
+    """Cached Bayesian fit; returns (ke_multiplier, multiplier_sd) so only new levels/doses trigger a refit."""
+    pk = VancoPK(ke, vd)
+    cr_func = _cached_cr(cr_tuple, p_info_tuple)
+    pk.fit_ke_from_levels(list(doses_tuple), list(level_times_tuple), list(levels_tuple), sim_start, cr_func=cr_func, patient_info=dict(p_info_tuple), mode="crcl")
+    return pk.ke_multiplier, pk.multiplier_sd
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _run_sims(ke, vd, ke_multipliers, doses_tuple, duration_days, sim_start, cr_tuple, p_info_tuple, mode):
+    """Cached VancoPK.run_multi: one kernel call for several multipliers (mode may be one per multiplier); pk.ke is as run() leaves it for the last one."""
+    cr_func = _cached_cr(cr_tuple, p_info_tuple)
+    pk = VancoPK(ke, vd)
+    res = pk.run_multi(list(doses_tuple), list(ke_multipliers), duration_days=duration_days, sim_start=sim_start, cr_func=cr_func, patient_info=dict(p_info_tuple), mode=mode)
+    return res, pk.ke
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _sim_regimens(ke, vd, ke_multiplier, regimens, sim_start, sim_end, cr_tuple, p_info_tuple, mode):
+    """Cached VancoPK.simulate_regimens for the suggested/try regimens, keyed on the scalars they depend on."""
+    pk = VancoPK(ke, vd)
+    pk.ke_multiplier = ke_multiplier
+    cr_func = _cached_cr(cr_tuple, p_info_tuple)
+    return pk.simulate_regimens(list(regimens), sim_start, sim_end, cr_func, dict(p_info_tuple), mode=mode)
+
+# ---------------------------
+# Results rendering
+# ---------------------------
+def show_metrics(label, res, dose=None, interval=None):
+    if dose and interval:
+        st.subheader(f"{label} ({dose:.0f} mg q{interval:.0f}h)")
+    else:
+        st.subheader(label)
+        
+    cols = st.columns(6) 
+    cols[0].metric("ke (1/h)", f"{res['ke']:.3f}")
+    cols[1].metric("Half-life (h)", f"{res['half_life']:.1f}")
+    cols[2].metric("Vd (L)", f"{res['vd']:.1f}")
+    cols[3].metric("AUC24", f"{res['auc24']:.0f}")
+    
+    if dose and interval:
+        cpk, ctr = calculate_ss_conc(res['ke'], res['vd'], dose, interval)
+        cols[4].metric("Cpkss (mg/L)", f"{cpk:.1f}")
+        cols[5].metric("Ctrss (mg/L)", f"{ctr:.1f}")
+    else:
+        cols[4].metric("Cpkss", "N/A")
+        cols[5].metric("Ctrss", "N/A")
+
+    # One band check picks both the message and the emitter
+    auc = res['auc24']
+    in_range = 400 <= auc <= 600
+    band = "within target range (400-600)" if in_range else "below target range (< 400)" if auc < 400 else "above target range (> 600)"
+    (st.success if in_range else st.error)(f"AUC24 of {auc:.0f} is {band}.")
+
+@st.fragment
+def _try_and_plot(pk, results, results_kgfr, ci_bounds, sim_start, sim_end, cr_key, p_info_key, levels, level_times,
+                  static_crcl, fit_status_msg, is_fitted, ordered_dose, ordered_interval):
+    """Try/suggested regimen, plot and metrics; widgets in here rerun only this fragment, not the fit/CI upstream."""
+    # ---------------------------
+    # Suggestion & Alignment
+    # ---------------------------
+    with st.container(border=True):
+        st.header("Try Regimen / Suggested Regimen")
+
+        show_try_regimen = st.checkbox("Show try/suggested regimen on graph", value=False)
+        
+        use_kgfr_suggestion = False
+        if results_kgfr is not None:
+            use_kgfr_suggestion = st.checkbox("Use estimated PK parameters from kGFR", value=False)
+
+        if use_kgfr_suggestion:
+            base_ke_kgfr = results_kgfr['ke'] / max(pk.ke_multiplier, 0.01)
+            pk_sugg = VancoPK(base_ke_kgfr, results_kgfr['vd'])
+            pk_sugg.ke_multiplier = pk.ke_multiplier
+            suggestion_mode = "kgfr"
+        else:
+            pk_sugg = pk
+            suggestion_mode = "crcl"
+
+        suggested_dose, suggested_interval, _ = suggest_regimen(pk_sugg, target_auc=500)
+        
+        # Placeholder so the label stays above the selectboxes but is filled after the batched simulation
+        suggestion_label = st.empty()
+
+        col1, col2 = st.columns(2)
+        try_dose = col1.selectbox("Try dose (mg)", DOSES, index=_DOSE_IDX[suggested_dose])
+        try_interval = col2.selectbox("Try interval (h)", INTERVALS, index=_INT_IDX[suggested_interval])
+
+        # Simulate the suggestion and (if shown and different) the try regimen in a single kernel call;
+        # the default try selection equals the suggestion, so its run is reused rather than repeated
+        regimens = [(suggested_dose, suggested_interval)]
+        if show_try_regimen and (try_dose, try_interval) != regimens[0]:
+            regimens.append((try_dose, try_interval))
+        regimen_sims = _sim_regimens(pk_sugg.ke, pk_sugg.vd, pk_sugg.ke_multiplier, tuple(regimens), sim_start, sim_end, cr_key, p_info_key, suggestion_mode)
+        simulated_suggested_auc = regimen_sims[0]['auc24']
+        try_results = regimen_sims[-1] if show_try_regimen else None
+
+        suggestion_label.markdown(f"**Suggested: {suggested_dose} mg q{suggested_interval}h** (Simulated AUC24 ≈ {simulated_suggested_auc:.0f})")
+
+    # ---------------------------
+    # Plotting
+    # ---------------------------
+    fig = plot_vanco_simulation(sim_start, results, _cached_cr(cr_key, p_info_key), levels, level_times, try_results, ci_bounds, static_crcl=static_crcl, results_kgfr=results_kgfr)
+    st.plotly_chart(fig, width="stretch")
+
+    if is_fitted:
+        st.info(fit_status_msg)
+    else:
+        st.warning(fit_status_msg)
+
+    with st.container(border=True):
+        show_metrics("Summary: Ordered Regimen", results, dose=ordered_dose, interval=ordered_interval)
+
+    if try_results:
+        with st.container(border=True):
+            show_metrics("Summary: Try Regimen", try_results, dose=try_dose, interval=try_interval)
+
+    if results_kgfr is not None:
+        with st.container(border=True):
+            show_metrics("Summary: Kinetic GFR", results_kgfr, dose=ordered_dose, interval=ordered_interval)
 
 # ---------------------------
 # Streamlit setup
@@ -33,43 +193,37 @@ with st.expander("⚖️ Legal Disclaimer & Terms of Use"):
     4. Pharmacokinetic models are mathematical approximations. Always verify dosing calculations.
     """)
 
-# Formatting of tabs
-st.markdown("""
-    <style>
-    div[data-testid="stTabs"] button { flex: 1; width: 100%; }
-    button[data-baseweb="tab"] {
-        font-size: 20px !important; font-weight: 800 !important;
-        background-color: #707070 !important; color: #FFFFFF !important;
-        border-radius: 8px 8px 0 0 !important; margin: 4px !important;
-        transition: background-color 0.3s ease;
-    }
-    button[aria-selected="true"] {
-        background-color: #e1f5fe !important; color: #007bff !important;
-        border-bottom: 5px solid #007bff !important;
-    }
-    button[data-baseweb="tab"]:hover {
-        background-color: #505050 !important; color: #007bff !important;
-    }
-    div[data-testid="stTabs"] p { font-size: 19px !important; font-weight: 800 !important; }
-    </style>
-    """, unsafe_allow_html=True)
+# Formatting of tabs (style-only, so st.html sends it outside the page layout)
+st.html(_TAB_CSS)
 
-tab1, tab2 = st.tabs(["Patient Data & Dosing", "Results & Simulation"])
+# Tabs track the selected one; the inputs tab always runs (it produces the inputs), and only the results tab
+# is skipped while it is hidden
+tab1, tab2 = st.tabs(["Patient Data & Dosing", "Results & Simulation"], key="main_tabs", on_change="rerun")
 
 with tab1:
     # ---------------------------
     # Simulation settings
     # ---------------------------
     if 'sim_start_date' not in st.session_state:
-        st.session_state.sim_start_date = datetime.now().date() - timedelta(days=1)
+        st.session_state.sim_start_date = _NOW.date() - timedelta(days=1)
         
     sim_start_date = st.date_input("Simulation Start Date", value=st.session_state.sim_start_date)
     sim_start = datetime.combine(sim_start_date, datetime.min.time())
 
+    # New-row times in the dose/level tables are fixed for the session: a dynamic-row editor's identity includes
+    # its column_config, so defaults that followed sim_start would reset both tables whenever the start date moved
+    if 'new_row_start' not in st.session_state:
+        st.session_state.new_row_start = sim_start
+    new_row_start = st.session_state.new_row_start
+
+    # Patient, PCr, dose and level inputs are batched in one form, so dragging a slider or editing a
+    # table doesn't refit and resimulate until the changes are applied
+    inputs_form = st.form("inputs", border=False)
+
     # ---------------------------
     # Patient inputs
     # ---------------------------
-    with st.container(border=True):
+    with inputs_form.container(border=True):
         st.header("Patient")
         age = st.slider("Age (years)", 17, 100, 65)
         sex = st.radio("Sex", ["Male", "Female"], horizontal=True)
@@ -79,7 +233,7 @@ with tab1:
     # ---------------------------
     # Plasma Creatinine
     # ---------------------------
-    with st.container(border=True):
+    with inputs_form.container(border=True):
         st.header("Plasma Creatinine")
         MUSCLE_FACTORS = {
             "High (Athletic / High Muscle), 1.25x": 1.25,
@@ -90,104 +244,83 @@ with tab1:
         muscle_mass_choice = st.selectbox("Presumed Muscle Mass", options=list(MUSCLE_FACTORS.keys()), index=1)
         selected_factor = MUSCLE_FACTORS[muscle_mass_choice]
 
-        if 'cr_entries' not in st.session_state:
-            st.session_state.cr_entries = [{'id': str(uuid.uuid4()), 'val': 100, 'time': datetime.now() - timedelta(days=1)}]
+        if 'cr_table' not in st.session_state:
+            st.session_state.cr_table = pd.DataFrame({'PCr (µmol/L)': [100], 'Time': [_NOW - timedelta(days=1)]})
 
         st.subheader("Measured PCr")
-        for i, entry in enumerate(st.session_state.cr_entries):
-            st.markdown(f"**PCr {i+1} (µmol/L)**")
-            entry['val'] = st.slider("", 35, 500, int(entry['val']), 1, key=f"cr_slider_input_{entry['id']}", label_visibility="collapsed")
-            cols = st.columns([2, 2, 0.5])
-            with cols[0]: d = st.date_input(f"Date {i+1}", value=entry['time'].date(), key=f"cr_date_{entry['id']}")
-            with cols[1]: 
-                t = st.time_input(f"Time {i+1}", value=entry['time'].time(), key=f"cr_time_{entry['id']}")
-                entry['time'] = datetime.combine(d, t)
-            with cols[2]:
-                if i > 0:
-                    st.markdown("<div style='height:28px'></div>", unsafe_allow_html=True)
-                    if st.button("✖", key=f"del_{entry['id']}", help="Remove this measurement"):
-                        st.session_state.cr_entries.pop(i)
-                        st.rerun()
-            st.divider()
-
-        if st.button("✚ Add Measured PCr", key="add_cr_btn", help="Allows for estimation of kinetic GFR with changing renal function. For best results, add one additional PCr measurement at least 24 hours after the first"):
-            last_val = st.session_state.cr_entries[-1]['val']
-            st.session_state.cr_entries.append({'id': str(uuid.uuid4()), 'val': last_val, 'time': datetime.now()})
-            st.rerun()
-
-        cr_data = [(e['time'], e['val']) for e in st.session_state.cr_entries]
-        p_info = {'age': age, 'sex': sex, 'weight': weight, 'height': height, 'muscle_factor': selected_factor}
-        cr_func = build_creatinine_function(cr_data=cr_data, future_cr=None, modified_factor=1.0, patient_params=p_info)
+        st.caption("Add rows to estimate kinetic GFR with changing renal function. For best results, add one additional PCr measurement at least 24 hours after the first.")
+        # One table widget for every measurement; rows are added/removed in place instead of per-row widgets
+        cr_table = st.data_editor(
+            st.session_state.cr_table, key="cr_editor", num_rows="dynamic", hide_index=True, width="stretch",
+            column_config={
+                'PCr (µmol/L)': st.column_config.NumberColumn(min_value=35, max_value=500, step=1, default=100, required=True),
+                'Time': st.column_config.DatetimeColumn(default=_NOW, format="D MMM YYYY, HH:mm", required=True),
+            },
+        ).dropna()
 
     # ---------------------------
     # Dose List Construction
     # ---------------------------
-    with st.container(border=True):
+    with inputs_form.container(border=True):
         st.header("Individual Vancomycin Doses")
-        if 'manual_doses' not in st.session_state:
-            st.session_state.manual_doses = [{'id': str(uuid.uuid4())}]
-
-        manual_dose_inputs, manual_time_inputs = [], []
-        for i, entry in enumerate(st.session_state.manual_doses):
-            is_enabled = st.checkbox(f"Enable individual dose {i+1}", key=f"md_on_{entry['id']}")
-            if is_enabled:
-                c1, c2, c3 = st.columns([1, 1, 1])
-                dose = c1.selectbox("Dose (mg)", [250, 500, 750, 1000, 1250, 1500, 1750, 2000, 2500], index=3, key=f"md_val_{entry['id']}")
-                d_md = c2.date_input("Date", sim_start.date(), key=f"md_d_{entry['id']}")
-                t_md = c3.time_input("Time", (sim_start + timedelta(hours=9, minutes=30)).time(), key=f"md_t_{entry['id']}")
-                manual_dose_inputs.append(dose)
-                manual_time_inputs.append(datetime.combine(d_md, t_md))
-                if i == len(st.session_state.manual_doses) - 1:
-                    st.session_state.manual_doses.append({'id': str(uuid.uuid4())})
-                    st.rerun()
-            else:
-                if len(st.session_state.manual_doses) > 1 and i < len(st.session_state.manual_doses) - 1:
-                    st.session_state.manual_doses = st.session_state.manual_doses[:i+1]
-                    st.rerun()
+        if 'dose_table' not in st.session_state:
+            st.session_state.dose_table = pd.DataFrame({'Dose (mg)': pd.Series(dtype='int64'), 'Time': pd.Series(dtype='datetime64[ns]')})
+
+        dose_table = st.data_editor(
+            st.session_state.dose_table, key="dose_editor", num_rows="dynamic", hide_index=True, width="stretch",
+            column_config={
+                'Dose (mg)': st.column_config.SelectboxColumn(options=DOSES, default=1000, required=True),
+                'Time': st.column_config.DatetimeColumn(default=new_row_start + timedelta(hours=9, minutes=30), format="D MMM YYYY, HH:mm", required=True),
+            },
+        ).dropna()
+        manual_dose_inputs = dose_table['Dose (mg)'].astype(float).tolist()
+        manual_time_inputs = [t.to_pydatetime() for t in dose_table['Time']]
 
         st.header("Ordered Vancomycin Regimen")
         show_ordered_dose = st.checkbox("Display ordered regimen", value=False)
-        ordered_dose, ordered_interval, ordered_start = None, None, None
-
-        if show_ordered_dose:
-            ordered_dose = st.selectbox("Ordered dose (mg)", [250, 500, 750, 1000, 1250, 1500, 1750, 2000, 2500], index=3)
-            ordered_interval = st.selectbox("Interval (h)", [6, 8, 12, 18, 24, 36, 48, 72], index=2)
-            col1, col2 = st.columns(2)
-            d_ord = col1.date_input("Ordered Start Date", (sim_start + timedelta(days=1)).date())
-            t_ord = col2.time_input("Ordered Start Time", (sim_start + timedelta(hours=9, minutes=30)).time())
-            ordered_start = datetime.combine(d_ord, t_ord)
-
-        # Build doses using a 30-day max window so it supports the auto-extend
-        max_sim_end = sim_start + timedelta(days=30)
-        doses = build_manual_doses(manual_dose_inputs, manual_time_inputs, sim_start)
-        if show_ordered_dose and ordered_dose:
-            doses += build_ordered_doses(ordered_dose, ordered_interval, ordered_start, sim_start, max_sim_end)
+        # Always rendered: inside the form the checkbox only takes effect once the inputs are applied
+        ordered_dose = st.selectbox("Ordered dose (mg)", DOSES, index=_DOSE_IDX[1000])
+        ordered_interval = st.selectbox("Interval (h)", INTERVALS, index=_INT_IDX[12])
+        col1, col2 = st.columns(2)
+        d_ord = col1.date_input("Ordered Start Date", (sim_start + timedelta(days=1)).date())
+        t_ord = col2.time_input("Ordered Start Time", (sim_start + timedelta(hours=9, minutes=30)).time())
+        ordered_start = datetime.combine(d_ord, t_ord)
+        if not show_ordered_dose:
+            ordered_dose, ordered_interval, ordered_start = None, None, None
 
     # ---------------------------
     # Measured levels
     # ---------------------------
-    with st.container(border=True):
+    with inputs_form.container(border=True):
         st.header("Measured Vancomycin Levels")
-        if 'level_entries' not in st.session_state:
-            st.session_state.level_entries = [{'id': str(uuid.uuid4())}]
-
-        levels, level_times = [], []
-        for i, entry in enumerate(st.session_state.level_entries):
-            is_enabled = st.checkbox(f"Enable level {i+1}", key=f"lvl_on_{entry['id']}")
-            if is_enabled:
-                lvl = st.number_input("Level (mg/L)", 0.0, 100.0, 15.0, step=0.1, key=f"lvl_val_{entry['id']}")
-                col1, col2 = st.columns(2)
-                d_lvl = col1.date_input("Date", sim_start.date(), key=f"lvl_date_{entry['id']}")
-                t_lvl = col2.time_input("Time", (sim_start + timedelta(hours=9)).time(), key=f"lvl_time_{entry['id']}")
-                levels.append(lvl)
-                level_times.append(datetime.combine(d_lvl, t_lvl))
-                if i == len(st.session_state.level_entries) - 1:
-                    st.session_state.level_entries.append({'id': str(uuid.uuid4())})
-                    st.rerun()
-            else:
-                if len(st.session_state.level_entries) > 1 and i < len(st.session_state.level_entries) - 1:
-                    st.session_state.level_entries = st.session_state.level_entries[:i+1]
-                    st.rerun()
+        if 'level_table' not in st.session_state:
+            st.session_state.level_table = pd.DataFrame({'Level (mg/L)': pd.Series(dtype='float64'), 'Time': pd.Series(dtype='datetime64[ns]')})
+
+        level_table = st.data_editor(
+            st.session_state.level_table, key="level_editor", num_rows="dynamic", hide_index=True, width="stretch",
+            column_config={
+                'Level (mg/L)': st.column_config.NumberColumn(min_value=0.0, max_value=100.0, step=0.1, default=15.0, required=True),
+                'Time': st.column_config.DatetimeColumn(default=new_row_start + timedelta(hours=9), format="D MMM YYYY, HH:mm", required=True),
+            },
+        ).dropna()
+        levels = level_table['Level (mg/L)'].astype(float).tolist()
+        level_times = [t.to_pydatetime() for t in level_table['Time']]
+
+    inputs_form.form_submit_button("Apply Changes", width="stretch")
+
+    if cr_table.empty:
+        st.error("Enter at least one PCr measurement.")
+        st.stop()
+
+    cr_data = [(t.to_pydatetime(), float(v)) for v, t in zip(cr_table['PCr (µmol/L)'], cr_table['Time'])]
+    p_info = {'age': age, 'sex': sex, 'weight': weight, 'height': height, 'muscle_factor': selected_factor}
+    cr_func = _cached_cr(tuple(cr_data), tuple(sorted(p_info.items())))
+
+    # Build doses using a 30-day max window so it supports the auto-extend
+    max_sim_end = sim_start + timedelta(days=30)
+    doses = build_manual_doses(manual_dose_inputs, manual_time_inputs, sim_start)
+    if show_ordered_dose and ordered_dose:
+        doses = np.concatenate([doses, build_ordered_doses(ordered_dose, ordered_interval, ordered_start, sim_start, max_sim_end)])
 
     # --- AUTO-REWIND SIMULATION START DATE ---
     # Collect all entered dates to find the earliest one
@@ -214,7 +347,7 @@ with tab1:
 
     # --- PROCEED BUTTON (Using JS to switch tabs without breaking CSS) ---
     st.markdown("<br>", unsafe_allow_html=True)
-    if st.button("Proceed to Results & Simulation ➡️", use_container_width=True, type="primary"):
+    if st.button("Proceed to Results & Simulation ➡️", width="stretch", type="primary"):
         js = '''
         <script>
             var tabs = window.parent.document.querySelectorAll('button[data-baseweb="tab"]');
@@ -231,8 +364,14 @@ with tab1:
 params = pk_params_from_patient(age, sex, weight, height, cr_func, sim_start, muscle_factor=selected_factor)
 pk = VancoPK(params['ke'], params['vd'])
 
+# Hashable keys for the cached simulation helpers
+doses_key = tuple(sorted(to_tuples(doses)))
+cr_key = tuple(cr_data)
+p_info_key = tuple(sorted(p_info.items()))
+
 if len(levels) >= 1:
-    pk.fit_ke_from_levels(doses, level_times, levels, sim_start, cr_func=cr_func, patient_info=p_info, mode="crcl")
+    # Only refit when the levels, doses or patient inputs change
+    pk.ke_multiplier, pk.multiplier_sd = _fit_ke(pk.ke, pk.vd, doses_key, tuple(levels), tuple(level_times), sim_start, cr_key, p_info_key)
     fit_status_msg = f"Model fitted to {len(levels)} level(s)."
     is_fitted = True
 else:
@@ -244,8 +383,8 @@ effective_ke_crcl = pk.ke * pk.ke_multiplier
 hl_crcl = (np.log(2) / effective_ke_crcl) if effective_ke_crcl > 0 else 24
 
 hl_kgfr = 0
-if len(st.session_state.cr_entries) >= 2:
-    last_cr_time = st.session_state.cr_entries[-1]['time']
+if len(cr_data) >= 2:
+    last_cr_time = cr_data[-1][0]
     _, latest_kgfr = cr_func(last_cr_time)
     if latest_kgfr is not None:
         vd_safe = pk.vd if (pk.vd and pk.vd > 0) else 50.0
@@ -260,141 +399,58 @@ auto_duration_days = max(7, min(auto_duration_days, 30)) # Restrict between 7 an
 # Results Tab
 # ---------------------------
 with tab2:
-    # Full-width slider
-    duration_days = st.slider(
-        "Simulation Duration (Days)", 
-        min_value=1, max_value=30, 
-        value=auto_duration_days,
-        help="Defaults to capturing at least 5 half-lives to show steady state (max 30 days)."
-    )
+    # Tab 1 edits skip the kGFR/CI/fitted runs and the try/suggested sims entirely
+    if tab2.open:
+        # Hidden tabs don't render their widgets, so remember the chosen duration across tab switches
+        # (until the inputs move the auto default)
+        saved_duration = st.session_state.get('sim_duration')
+        duration_value = saved_duration[1] if saved_duration and saved_duration[0] == auto_duration_days else auto_duration_days
+
+        # Full-width slider
+        duration_days = st.slider(
+            "Simulation Duration (Days)", 
+            min_value=1, max_value=30, 
+            value=duration_value,
+            help="Defaults to capturing at least 5 half-lives to show steady state (max 30 days)."
+        )
     
-    # Notification appearing below the slider
-    if auto_duration_days > 7 and duration_days == auto_duration_days:
-        st.info(f"⏳ Auto-extended to **{auto_duration_days} days** (5 × t½ of ~{max_hl:.1f}h).")
-
-    sim_end = sim_start + timedelta(days=duration_days)
-
-    # 3. Final Simulation Runs
-    results_kgfr = None
-    if len(st.session_state.cr_entries) >= 2:
-        results_kgfr = pk.run(doses=doses, duration_days=duration_days, sim_start=sim_start, cr_func=cr_func, patient_info=p_info, mode="kgfr")
-
-    results = pk.run(doses=doses, duration_days=duration_days, sim_start=sim_start, cr_func=cr_func, patient_info=p_info, mode="crcl")
-
-    # ---------------------------
-    # Suggestion & Alignment
-    # ---------------------------
-    with st.container(border=True):
-        st.header("Try Regimen / Suggested Regimen")
-
-        show_try_regimen = st.checkbox("Show try/suggested regimen on graph", value=False)
-        
-        use_kgfr_suggestion = False
-        if results_kgfr is not None:
-            use_kgfr_suggestion = st.checkbox("Use estimated PK parameters from kGFR", value=False)
-
-        if use_kgfr_suggestion:
-            base_ke_kgfr = results_kgfr['ke'] / max(pk.ke_multiplier, 0.01)
-            pk_sugg = VancoPK(base_ke_kgfr, results_kgfr['vd'])
-            pk_sugg.ke_multiplier = pk.ke_multiplier
-            suggestion_mode = "kgfr"
+        # Notification appearing below the slider
+        if auto_duration_days > 7 and duration_days == auto_duration_days:
+            st.info(f"⏳ Auto-extended to **{auto_duration_days} days** (5 × t½ of ~{max_hl:.1f}h).")
+
+        st.session_state.sim_duration = (auto_duration_days, duration_days)
+        sim_end = sim_start + timedelta(days=duration_days)
+
+        # 3. Final Simulation Runs
+        # The kGFR run, the CI bounds (with levels) and the fitted run share one kernel call and one creatinine
+        # evaluation; the fitted crcl run goes last so pk.ke comes back as its trailing 24h baseline
+        has_kgfr, has_ci = len(cr_data) >= 2, len(levels) >= 1
+        scenarios = [("kgfr", pk.ke_multiplier)] if has_kgfr else []
+        if has_ci:
+            mult_lo, mult_hi = pk.compute_ci(level=0.5)
+            scenarios += [("crcl", mult_lo), ("crcl", mult_hi)]
+        scenarios.append(("crcl", pk.ke_multiplier))
+        modes, mults = zip(*scenarios)
+        res_list, pk.ke = _run_sims(pk.ke, pk.vd, mults, doses_key, duration_days, sim_start, cr_key, p_info_key, modes)
+
+        results = res_list[-1]
+        results_kgfr = res_list[0] if has_kgfr else None
+        ci_bounds = (res_list[-3], res_list[-2]) if has_ci else None
+
+        if cr_data:
+            static_params = pk_params_from_patient(age, sex, weight, height, cr_func, when=cr_data[-1][0], muscle_factor=selected_factor)
+            current_static_crcl = static_params['crcl']
         else:
-            pk_sugg = pk
-            suggestion_mode = "crcl"
+            current_static_crcl = None
 
-        suggested_dose, suggested_interval, _ = suggest_regimen(pk_sugg, target_auc=500, patient_info=p_info)
-        
-        suggestion_sim = pk_sugg.simulate_regimen(
-            suggested_dose, suggested_interval, sim_start, sim_end, cr_func, p_info, mode=suggestion_mode
+        _try_and_plot(
+            pk, results, results_kgfr, ci_bounds, sim_start, sim_end, cr_key, p_info_key, levels, level_times,
+            current_static_crcl, fit_status_msg, is_fitted,
+            ordered_dose if show_ordered_dose else None, ordered_interval if show_ordered_dose else None
         )
-        simulated_suggested_auc = suggestion_sim['auc24']
-
-        st.markdown(f"**Suggested: {suggested_dose} mg q{suggested_interval}h** (Simulated AUC24 ≈ {simulated_suggested_auc:.0f})")
-
-        col1, col2 = st.columns(2)
-        try_dose = col1.selectbox("Try dose (mg)", [250, 500, 750, 1000, 1250, 1500, 1750, 2000, 2500], 
-                                index=[250, 500, 750, 1000, 1250, 1500, 1750, 2000, 2500].index(suggested_dose))
-        try_interval = col2.selectbox("Try interval (h)", [6, 8, 12, 18, 24, 36, 48, 72], 
-                                    index=[6, 8, 12, 18, 24, 36, 48, 72].index(suggested_interval))
-
-        if show_try_regimen:
-            try_results = pk_sugg.simulate_regimen(try_dose, try_interval, sim_start, sim_end, cr_func, p_info, mode=suggestion_mode)
-        else:
-            try_results = None
-
-    # ---------------------------
-    # Plotting
-    # ---------------------------
-    ci_bounds = None
-    if len(levels) >= 1:
-        mult_lo, mult_hi = pk.compute_ci(level=0.5)
-        current_fitted_mult = pk.ke_multiplier
-        pk.ke_multiplier = mult_hi 
-        res_hi = pk.run(doses, duration_days=duration_days, sim_start=sim_start, cr_func=cr_func, patient_info=p_info, mode="crcl")
-        pk.ke_multiplier = mult_lo
-        res_lo = pk.run(doses, duration_days=duration_days, sim_start=sim_start, cr_func=cr_func, patient_info=p_info, mode="crcl")
-        pk.ke_multiplier = current_fitted_mult
-        ci_bounds = (res_lo, res_hi)
-
-    if st.session_state.cr_entries:
-        last_entry = st.session_state.cr_entries[-1]
-        static_params = pk_params_from_patient(age, sex, weight, height, cr_func, when=last_entry['time'], muscle_factor=selected_factor)
-        current_static_crcl = static_params['crcl']
-    else:
-        current_static_crcl = None
-
-    fig = plot_vanco_simulation(sim_start, results, cr_func, levels, level_times, try_results, ci_bounds, static_crcl=current_static_crcl, results_kgfr=results_kgfr)
-    st.plotly_chart(fig, use_container_width=True)
-
-    if is_fitted:
-        st.info(fit_status_msg)
-    else:
-        st.warning(fit_status_msg)
-
-    # ---------------------------
-    # Metrics
-    # ---------------------------
-    def show_metrics(label, res, dose=None, interval=None):
-        if dose and interval:
-            st.subheader(f"{label} ({dose:.0f} mg q{interval:.0f}h)")
-        else:
-            st.subheader(label)
-            
-        cols = st.columns(6) 
-        cols[0].metric("ke (1/h)", f"{res['ke']:.3f}")
-        cols[1].metric("Half-life (h)", f"{res['half_life']:.1f}")
-        cols[2].metric("Vd (L)", f"{res['vd']:.1f}")
-        cols[3].metric("AUC24", f"{res['auc24']:.0f}")
-        
-        if dose and interval:
-            cpk, ctr = calculate_ss_conc(res['ke'], res['vd'], dose, interval)
-            cols[4].metric("Cpkss (mg/L)", f"{cpk:.1f}")
-            cols[5].metric("Ctrss (mg/L)", f"{ctr:.1f}")
-        else:
-            cols[4].metric("Cpkss", "N/A")
-            cols[5].metric("Ctrss", "N/A")
-
-        auc = res['auc24']
-        if 400 <= auc <= 600:
-            st.success(f"AUC24 of {auc:.0f} is within target range (400-600).")
-        elif auc < 400:
-            st.error(f"AUC24 of {auc:.0f} is below target range (< 400).")
-        else:
-            st.error(f"AUC24 of {auc:.0f} is above target range (> 600).")
-    
-    with st.container(border=True):
-        show_metrics("Summary: Ordered Regimen", results, dose=ordered_dose if show_ordered_dose else None, interval=ordered_interval if show_ordered_dose else None)
-
-    if try_results:
-        with st.container(border=True):
-            show_metrics("Summary: Try Regimen", try_results, dose=try_dose, interval=try_interval)
 
-    if results_kgfr is not None:
-        with st.container(border=True):
-            show_metrics("Summary: Kinetic GFR", results_kgfr, dose=ordered_dose if show_ordered_dose else None, interval=ordered_interval if show_ordered_dose else None)
-    
     st.markdown("<br>", unsafe_allow_html=True)
-    if st.button("⬅️ Back to Patient Data & Dosing", use_container_width=True):
+    if st.button("⬅️ Back to Patient Data & Dosing", width="stretch"):
         js_back = '''
         <script>
             var tabs = window.parent.document.querySelectorAll('button[data-baseweb="tab"]');
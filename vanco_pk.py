@@ -1,7 +1,7 @@
 from narwhals import when
 import numpy as np
+from numba import njit
 from dataclasses import dataclass
-from datetime import datetime, timedelta
 
 INFUSION_RATE = 1000.0
 LN2 = np.log(2)
@@ -15,32 +15,90 @@ def calculate_ss_conc(ke, vd, dose, interval, infusion_rate=INFUSION_RATE):
     ctr_ss = cpk_ss * np.exp(-ke * (interval - t_inf))
     return cpk_ss, ctr_ss
 
+@njit(cache=True)
+def _conc_trace(t_grid, dose_times, dose_mg, ke_traj, vd):
+    """
+    Steps the one-compartment infusion model over t_grid; compiled so the per-step loop skips the interpreter.
+    ke and the infusion rate are constant within a step, so each step uses the exact closed-form solution.
+    """
+    dt = t_grid[1] - t_grid[0]
+    # Mark the grid points inside each infusion window [start, end] up front (binary search per dose),
+    # so the time loop below no longer scans every dose at every step
+    infusing = np.zeros(t_grid.size, dtype=np.bool_)
+    for j in range(dose_times.size):
+        lo = np.searchsorted(t_grid, dose_times[j], side='left')
+        hi = np.searchsorted(t_grid, dose_times[j] + dose_mg[j] / INFUSION_RATE + 1e-9, side='right')
+        infusing[lo:hi] = True
+
+    conc = np.zeros_like(t_grid)
+    curr_c = 0.0
+    for i in range(t_grid.size):
+        rate_in = INFUSION_RATE / vd if infusing[i] else 0.0
+        # C(t+dt) = C(t)e^(-ke dt) + (R/ke)(1 - e^(-ke dt)); ke is clamped > 0 so the division is safe
+        decay = np.exp(-ke_traj[i] * dt)
+        curr_c = curr_c * decay + (rate_in / ke_traj[i]) * (1.0 - decay)
+        conc[i] = max(curr_c, 0.0)
+    return conc
+
+@njit(cache=True)
+def _conc_traces(t_grid, dose_times, dose_mg, dose_offsets, ke_trajs, vd):
+    """Runs _conc_trace for several dose sets in one call; set r is dose_times[dose_offsets[r]:dose_offsets[r+1]]."""
+    n_sets = dose_offsets.size - 1
+    conc = np.empty((n_sets, t_grid.size))
+    for r in range(n_sets):
+        lo, hi = dose_offsets[r], dose_offsets[r + 1]
+        conc[r] = _conc_trace(t_grid, dose_times[lo:hi], dose_mg[lo:hi], ke_trajs[r], vd)
+    return conc
+
+def _time_grid(duration_days):
+    """5-minute simulation grid from 0 to duration_days (in hours)."""
+    t_max = duration_days * 24
+    return np.linspace(0, t_max, int(t_max * 12) + 1)
+
+def _dose_arrays(doses):
+    """Splits (time_h, mg) doses, as an (N, 2) array or a list of tuples, into float64 arrays for _conc_trace."""
+    doses = np.asarray(doses, dtype=np.float64).reshape(-1, 2)
+    return np.ascontiguousarray(doses[:, 0]), np.ascontiguousarray(doses[:, 1])
+
+# Compile (or load from the on-disk cache) at import so the first simulation doesn't pay the JIT cost
+_conc_trace(np.linspace(0.0, 1.0, 3), np.zeros(1), np.ones(1), np.full(3, 0.1), 1.0)
+_conc_traces(np.linspace(0.0, 1.0, 3), np.zeros(1), np.ones(1), np.array([0, 1]), np.full((1, 3), 0.1), 1.0)
+
+def _clamp_ke(ke_traj):
+    """Clamps ke to the physiological range [0.005, 0.17] 1/h, with NaN falling back to 0.05."""
+    ke_traj = np.clip(ke_traj, 0.005, 0.17)
+    ke_traj[np.isnan(ke_traj)] = 0.05
+    return ke_traj
+
 @dataclass
 class Dose:
     time: float
     amount: float
     ke: float = None
 
+def _ke_from_cr(cr, age, sex, muscle_factor=1.0):
+    """Population ke and CrCl from creatinine; cr may be a scalar or an array of samples."""
+    # Apply muscle factor to the Cockcroft-Gault numerator
+    k_sex = 0.85 if sex.lower().startswith("f") else 1.0
+    crcl = ((140 - age) * 88.4 * k_sex * 0.9 * muscle_factor) / cr
+    
+    ke = np.clip(0.00083 * crcl + 0.0044, 0.693 / 120, 0.693 / 5.5)
+    return ke, crcl
+
 def pk_params_from_patient(age, sex, weight, height, cr_func, when, muscle_factor=1.0):
+    # Sex-dependent IBW is fixed for the patient, so it is resolved once up front
+    ibw = (50 if sex.lower().startswith("m") else 45.5) + 0.9 * (height - 152)
+
     cr_data = cr_func(when)
     cr = cr_data[0] if isinstance(cr_data, (tuple, list)) else cr_data
     cr = max(cr, 10.0)
     if cr is None or cr <= 0:
         cr = 88.4
         
-    # Apply muscle factor to the Cockcroft-Gault numerator
-    k_sex = 0.85 if sex.lower().startswith("f") else 1.0
-    crcl = ((140 - age) * 88.4 * k_sex * 0.9 * muscle_factor) / cr
-    
-    ke = 0.00083 * crcl + 0.0044
-    ke = max(min(ke, 0.693 / 5.5), 0.693 / 120)
-    if sex.lower().startswith("m"):
-        ibw = 50 + 0.9 * (height - 152)
-    else:
-        ibw = 45.5 + 0.9 * (height - 152)
+    ke, crcl = _ke_from_cr(cr, age, sex, muscle_factor)
     weight_for_vd = ibw + 0.4 * (weight - ibw) if weight > 1.25 * ibw else weight
     vd = 0.8 * weight_for_vd
-    return {"ke": ke, "vd": vd, "crcl": crcl}
+    return {"ke": float(ke), "vd": vd, "crcl": crcl}
 
 class VancoPK:
     def __init__(self, ke, vd):
@@ -53,72 +111,52 @@ class VancoPK:
         if patient_info is None:
                 raise ValueError("patient_info dictionary must be provided to run simulation.")
 
+        t_grid = _time_grid(duration_days)
+        vd_safe = self.vd if (self.vd and self.vd > 0) else 50.0
+        ke_traj = self._ke_trajectory(t_grid, sim_start, cr_func, patient_info, mode, vd_safe)
+
+        dose_times, dose_mg = _dose_arrays(doses)
+        conc = _conc_trace(t_grid, dose_times, dose_mg, ke_traj, vd_safe)
+        return self._summarize(t_grid, conc, ke_traj, vd_safe)
+
+    def _ke_trajectory(self, t_grid, sim_start, cr_func, patient_info, mode, vd_safe):
+        """Clamped, multiplier-adjusted ke at every grid point."""
+        base_ke_traj = self._base_ke_trajectory(t_grid, sim_start, cr_func, patient_info, mode, vd_safe)
+        return _clamp_ke(base_ke_traj * self.ke_multiplier)
+
+    def _base_ke_trajectory(self, t_grid, sim_start, cr_func, patient_info, mode, vd_safe):
+        """Unclamped ke at every grid point, before the fitted multiplier is applied."""
+        return self._base_ke_trajectories(t_grid, sim_start, cr_func, patient_info, (mode,), vd_safe)[mode]
+
+    def _base_ke_trajectories(self, t_grid, sim_start, cr_func, patient_info, modes, vd_safe):
+        """_base_ke_trajectory for each of modes, sharing one creatinine/kGFR evaluation of the grid."""
         age = patient_info['age']
         sex = patient_info['sex']
-        weight = patient_info['weight']
-        height = patient_info['height']
         muscle_factor = patient_info.get('muscle_factor', 1.0)
-                
-        t_max = duration_days * 24
-        t_grid = np.linspace(0, t_max, int(t_max * 12) + 1)
-        dt = t_grid[1] - t_grid[0]
-        steps_per_24h = int(24 / dt)    
-
-        dose_intervals = []
-        for t_d, amt in doses:
-            duration = amt / INFUSION_RATE
-            dose_intervals.append((t_d, t_d + duration))
 
         pop_ke_traj = np.full_like(t_grid, self.ke)
+        kgfr_traj = None
         if cr_func and patient_info and sim_start:
-            for i, t_h in enumerate(t_grid):
-                pop_ke_traj[i] = pk_params_from_patient(
-                    patient_info['age'], patient_info['sex'], 
-                    patient_info['weight'], patient_info['height'], 
-                    cr_func, sim_start + timedelta(hours=t_h),
-                    muscle_factor=muscle_factor
-                )['ke']
-
-        self.ke = pop_ke_traj[-1] 
-
-        conc = np.zeros_like(t_grid)
-        curr_c = 0.0
-        active_ke = self.ke
-
-        ke_history = []
-
-        for i, t_h in enumerate(t_grid):
-            current_dt = sim_start + timedelta(hours=t_h)
-            cr_val, kgfr = cr_func(current_dt)
-            
-            vd_safe = self.vd if (self.vd and self.vd > 0) else 50.0
-            
-            if mode == "kgfr" and kgfr is not None:
-                active_ke = ((kgfr * 0.06) / vd_safe) * self.ke_multiplier
-            else:
-                active_ke = pop_ke_traj[i] * self.ke_multiplier
-            
-            active_ke = max(min(active_ke, 0.17), 0.005)
-            
-            if np.isnan(active_ke):
-                active_ke = 0.05
-                
-            ke_history.append(active_ke) 
-
-            self.ke = active_ke / max(self.ke_multiplier, 0.01)
-            
-            rate_in = 0.0
-            for t_d, amt in doses:
-                duration = amt / INFUSION_RATE
-                if t_d <= t_h <= (t_d + duration + 1e-9):
-                    rate_in = INFUSION_RATE / vd_safe
-                    break
-            
-            curr_c += (rate_in - active_ke * curr_c) * dt
-            conc[i] = max(curr_c, 0)
-
-        last_24h_ke = np.mean(ke_history[-steps_per_24h:]) if len(ke_history) >= steps_per_24h else active_ke
-        self.ke = last_24h_ke / max(self.ke_multiplier, 0.01)
+            # Evaluate creatinine/kGFR over the whole grid in one vectorized call
+            ts_grid = sim_start.timestamp() + t_grid * 3600.0
+            cr_traj, kgfr_traj = cr_func.vec(ts_grid)
+            pop_ke_traj, _ = _ke_from_cr(np.maximum(cr_traj, 10.0), age, sex, muscle_factor)
+
+        if kgfr_traj is None:
+            return {mode: pop_ke_traj for mode in modes}
+        return {mode: (kgfr_traj * 0.06) / vd_safe if mode == "kgfr" else pop_ke_traj for mode in modes}
+
+    def _summarize(self, t_grid, conc, ke_traj, vd_safe, multiplier=None):
+        """Builds the result dict for one trace and leaves self.ke at the trailing 24h baseline ke."""
+        if multiplier is None:
+            multiplier = self.ke_multiplier
+        dt = t_grid[1] - t_grid[0]
+        steps_per_24h = int(24 / dt)
+
+        active_ke = float(ke_traj[-1])
+
+        last_24h_ke = np.mean(ke_traj[-steps_per_24h:]) if len(ke_traj) >= steps_per_24h else active_ke
+        self.ke = last_24h_ke / max(multiplier, 0.01)
 
         if len(conc) >= steps_per_24h:
             auc24 = conc[-steps_per_24h:].sum() * dt
@@ -134,62 +172,73 @@ class VancoPK:
             "half_life": (np.log(2) / active_ke) if active_ke > 0 else 0
         }
                 
+    def run_multi(self, doses, ke_multipliers, duration_days=7, sim_start=None, cr_func=None, patient_info=None, mode="crcl"):
+        """
+        run() for several ke multipliers in one kernel call, sharing the grid, doses and creatinine trajectory.
+        mode is either one mode for every multiplier or a sequence giving each multiplier its own mode.
+        Returns one result dict per multiplier; self.ke is left as run() would for the last one.
+        """
+        if patient_info is None:
+                raise ValueError("patient_info dictionary must be provided to run simulation.")
+
+        t_grid = _time_grid(duration_days)
+        vd_safe = self.vd if (self.vd and self.vd > 0) else 50.0
+        mults = np.asarray(ke_multipliers, dtype=np.float64)
+        modes = [mode] * len(mults) if isinstance(mode, str) else list(mode)
+        base_ke_trajs = self._base_ke_trajectories(t_grid, sim_start, cr_func, patient_info, set(modes), vd_safe)
+        ke_trajs = _clamp_ke(mults[:, None] * np.stack([base_ke_trajs[m] for m in modes]))
+
+        # Every set shares the same schedule, so repeat it CSR-style once per multiplier
+        dose_times, dose_mg = _dose_arrays(doses)
+        offsets = np.arange(len(mults) + 1, dtype=np.int64) * dose_times.size
+        concs = _conc_traces(t_grid, np.tile(dose_times, len(mults)), np.tile(dose_mg, len(mults)), offsets, ke_trajs, vd_safe)
+        return [self._summarize(t_grid, conc, ke_traj, vd_safe, multiplier=m) for conc, ke_traj, m in zip(concs, ke_trajs, mults)]
+
     def simulate_regimen(self, dose_mg, interval_h, start_dt, end_dt, cr_func, patient_info, mode="crcl"):
-            duration_h = (end_dt - start_dt).total_seconds() / 3600
-            duration_days = duration_h / 24
-            
-            try_doses = []
-            curr_t = 0.0
-            while curr_t < duration_h:
-                try_doses.append((curr_t, dose_mg))
-                curr_t += interval_h
-                
-            return self.run(
-                doses=try_doses, 
-                duration_days=duration_days, 
-                sim_start=start_dt, 
-                cr_func=cr_func, 
-                patient_info=patient_info,
-                mode=mode
-            )
+            return self.simulate_regimens([(dose_mg, interval_h)], start_dt, end_dt, cr_func, patient_info, mode=mode)[0]
+
+    def simulate_regimens(self, regimens, start_dt, end_dt, cr_func, patient_info, mode="crcl"):
+        """Simulates several (dose_mg, interval_h) regimens in one kernel call, sharing the grid and ke trajectory."""
+        if patient_info is None:
+                raise ValueError("patient_info dictionary must be provided to run simulation.")
+
+        duration_h = (end_dt - start_dt).total_seconds() / 3600
+        t_grid = _time_grid(duration_h / 24)
+        vd_safe = self.vd if (self.vd and self.vd > 0) else 50.0
+        ke_traj = self._ke_trajectory(t_grid, start_dt, cr_func, patient_info, mode, vd_safe)
+
+        # Flatten the ragged dose schedules CSR-style: set r owns dose_times[offsets[r]:offsets[r+1]]
+        dose_times = [np.arange(0.0, duration_h, interval_h) for _, interval_h in regimens]
+        dose_mg = [np.full(len(t), float(dose)) for t, (dose, _) in zip(dose_times, regimens)]
+        offsets = np.concatenate([[0], np.cumsum([len(t) for t in dose_times])]).astype(np.int64)
+
+        concs = _conc_traces(
+            t_grid, np.concatenate(dose_times), np.concatenate(dose_mg), offsets,
+            np.tile(ke_traj, (len(regimens), 1)), vd_safe
+        )
+        return [self._summarize(t_grid, conc, ke_traj, vd_safe) for conc in concs]
 
     def _run_fast(self, doses, t_grid, ke_traj, multiplier):
-        dt = t_grid[1] - t_grid[0]
-        conc = np.zeros_like(t_grid)
-        curr_c = 0.0
-        for i, t_h in enumerate(t_grid):
-            active_ke = ke_traj[i] * multiplier
-            rate_in = 0.0
-            for t_d, amt in doses:
-                if t_d <= t_h <= (t_d + amt/INFUSION_RATE + 1e-9):
-                    rate_in = INFUSION_RATE / self.vd
-                    break
-            curr_c += (rate_in - active_ke * curr_c) * dt
-            conc[i] = max(curr_c, 0)
-        return conc
+        dose_times, dose_mg = _dose_arrays(doses)
+        return _conc_trace(t_grid, dose_times, dose_mg, ke_traj * multiplier, self.vd)
 
     def fit_ke_from_levels(self, doses, times_dt, obs, sim_start, cr_func, patient_info, duration_days=7, mode="crcl"):
-        times_h = [(t - sim_start).total_seconds() / 3600 for t in times_dt]
+        # Level times as hours from sim_start in one datetime64 subtraction
+        times_h = (np.array(times_dt, dtype='datetime64[us]') - np.datetime64(sim_start, 'us')).astype(np.float64) / 3.6e9
         obs = np.array(obs)
 
-        t_max = duration_days * 24 
-        t_grid = np.linspace(0, t_max, int(t_max * 12) + 1)
+        t_grid = _time_grid(duration_days)
+        
+        ts_grid = sim_start.timestamp() + t_grid * 3600.0
+        cr_traj, kgfr_traj = cr_func.vec(ts_grid)
+        muscle_factor = patient_info.get('muscle_factor', 1.0)
         
-        base_ke_traj = np.zeros_like(t_grid)
-        for i, th in enumerate(t_grid):
-            current_dt = sim_start + timedelta(hours=th)
-            cr_val, kgfr = cr_func(current_dt)
-            muscle_factor = patient_info.get('muscle_factor', 1.0)
-            
-            if mode == "kgfr" and kgfr is not None:
-                base_ke_traj[i] = (kgfr * 0.06) / self.vd
-            else:
-                p_dict = pk_params_from_patient(
-                    patient_info['age'], patient_info['sex'], 
-                    patient_info['weight'], patient_info['height'], 
-                    cr_func, current_dt, muscle_factor=muscle_factor
-                )
-                base_ke_traj[i] = p_dict['ke']
+        if mode == "kgfr" and kgfr_traj is not None:
+            base_ke_traj = (kgfr_traj * 0.06) / self.vd
+        else:
+            base_ke_traj, _ = _ke_from_cr(
+                np.maximum(cr_traj, 10.0), patient_info['age'], patient_info['sex'], muscle_factor
+            )
 
         mult_grid = np.linspace(0.3, 3.0, 100)
         log_post = []